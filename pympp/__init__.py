@@ -1,3 +1,9 @@
 from .mips import set
-from .cpu import CPU
-from .api import Simulator
+from .cpu import CPU, simulate, simulate_many
+
+def __getattr__(name):
+    # the API layer pulls in fastapi/pydantic, only load it when Simulator is asked for
+    if name == "Simulator":
+        from .api import Simulator
+        return Simulator
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
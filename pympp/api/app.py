@@ -5,7 +5,7 @@ from typing import List, Dict, Any, Optional
 from ..cpu import CPU
 from .assembler import assemble
 from ..util.type import hex32
-from ..base import Stage, Word
+from ..base import Stage
 from ..log import get_logger
 from .schema import (
     LoadResponse, ResetResponse, CycleInfo, MemoryPageResponse,
@@ -77,11 +77,11 @@ class Simulator:
                     reg_idx = REG_NAMES.index(reg_name)
                 else:
                     reg_idx = int(reg_name)
-                self.cpu.regs.regs[reg_idx] = Word(int(val_hex, 16))
+                self.cpu.regs.regs[reg_idx] = int(val_hex, 16) & 0xFFFFFFFF
                 
         if initial_memory:
             for addr_hex, val_hex in initial_memory.items():
-                self.cpu.dmem.data[int(addr_hex, 16)] = Word(int(val_hex, 16))
+                self.cpu.dmem.store_w(int(addr_hex, 16), int(val_hex, 16))
 
         self.source_map = source_map
         self.display_cycle = 0
@@ -91,9 +91,7 @@ class Simulator:
     def is_finished(self) -> bool:
         if not self.cpu:
             return True
-        # Only finished when: PC out of bounds, pipeline empty, AND last snapshot shows empty pipeline
-        # This allows user to step one more time after pipeline becomes empty
-        return self.cpu._is_pc_out_of_bounds() and self.cpu._is_pipeline_empty() and self.cpu._is_last_snapshot_empty()
+        return self.cpu.is_finished()
 
     def ensure_cpu(self):
         if not self.cpu:
@@ -334,12 +332,12 @@ def step_cycle(manager: Simulator = Depends(get_simulator)):
     if manager.display_cycle < manager.cpu.cycle:
         if manager.display_cycle + 1 < len(manager.cpu.history):
             manager.display_cycle += 1
-            return _to_snapshot_schema(manager.cpu.history[manager.display_cycle])    
+            return _to_snapshot_schema(manager.cpu.get_snapshot(manager.display_cycle))    
     # Else need to run simulation
     if manager.is_finished():
          if manager.cpu.history:
              manager.display_cycle = manager.cpu.cycle
-             return _to_snapshot_schema(manager.cpu.history[-1])
+             return _to_snapshot_schema(manager.cpu.get_snapshot(-1))
     
     manager.cpu.step()
     manager.display_cycle = manager.cpu.cycle
@@ -348,7 +346,7 @@ def step_cycle(manager: Simulator = Depends(get_simulator)):
     if manager.display_cycle >= len(manager.cpu.history):
         manager.display_cycle = len(manager.cpu.history) - 1
         
-    return _to_snapshot_schema(manager.cpu.history[manager.display_cycle])
+    return _to_snapshot_schema(manager.cpu.get_snapshot(manager.display_cycle))
 
 @app.post("/step_back", response_model=SnapshotSchema)
 def step_back(manager: Simulator = Depends(get_simulator)):
@@ -356,7 +354,7 @@ def step_back(manager: Simulator = Depends(get_simulator)):
     if manager.display_cycle > 0:
         manager.display_cycle -= 1
     
-    return _to_snapshot_schema(manager.cpu.history[manager.display_cycle])
+    return _to_snapshot_schema(manager.cpu.get_snapshot(manager.display_cycle))
 
 @app.post("/continue", response_model=SnapshotSchema)
 def continue_exec(manager: Simulator = Depends(get_simulator)):
@@ -365,21 +363,15 @@ def continue_exec(manager: Simulator = Depends(get_simulator)):
     manager.display_cycle = manager.cpu.cycle
     if manager.display_cycle >= len(manager.cpu.history):
         manager.display_cycle = len(manager.cpu.history) - 1
-    return _to_snapshot_schema(manager.cpu.history[manager.display_cycle])
+    return _to_snapshot_schema(manager.cpu.get_snapshot(manager.display_cycle))
 
 @app.post("/run_until_end", response_model=List[SnapshotSchema])
 def run_until_end(max_cycles: int = 1000, manager: Simulator = Depends(get_simulator)):
     manager.ensure_cpu()
 
-    # Run loop
-    for _ in range(max_cycles):
-        if manager.is_finished():
-            break
-
-        manager.cpu.step()
-
+    manager.cpu.run(max_cycles)
     manager.display_cycle = manager.cpu.cycle
-    return [_to_snapshot_schema(snap) for snap in manager.cpu.history]
+    return [_to_snapshot_schema(snap) for snap in manager.cpu.get_snapshots()]
 
 @app.post("/reset", response_model=ResetResponse)
 def reset(manager: Simulator = Depends(get_simulator)):
@@ -410,16 +402,16 @@ def get_snapshot(cycle: int, manager: Simulator = Depends(get_simulator)):
     # Check if we have the requested cycle
     if 0 <= cycle < len(manager.cpu.history):
         manager.display_cycle = cycle
-        return _to_snapshot_schema(manager.cpu.history[cycle])
+        return _to_snapshot_schema(manager.cpu.get_snapshot(cycle))
     
     # If simulation finished or stopped before reaching cycle
     if manager.cpu.history:
         if manager.is_finished():
             manager.display_cycle = manager.cpu.history[-1]["cycle"]
-            return _to_snapshot_schema(manager.cpu.history[-1], outofbound=True)
+            return _to_snapshot_schema(manager.cpu.get_snapshot(-1), outofbound=True)
         else:
             manager.display_cycle = manager.cpu.history[-1]["cycle"]
-            return _to_snapshot_schema(manager.cpu.history[-1])
+            return _to_snapshot_schema(manager.cpu.get_snapshot(-1))
 
     raise HTTPException(status_code=404, detail="Simulation finished")
 
@@ -460,7 +452,7 @@ def get_memory_page(start_addr: str, lines: int = 16, cycle: Optional[int] = Non
     mem_source = None
     if cycle is not None:
         if 0 <= cycle < len(manager.cpu.history):
-            mem_source = manager.cpu.history[cycle]["memory"]
+            mem_source = manager.cpu.get_snapshot(cycle)["memory"]
         else:
             pass
     
@@ -474,8 +466,8 @@ def get_memory_page(start_addr: str, lines: int = 16, cycle: Optional[int] = Non
             val_hex = mem_source.get(addr_hex, "00000000")
             values.append(val_hex)
         else:
-            val_word = manager.cpu.dmem.read(addr)
-            values.append(hex32(val_word.value))
+            val = manager.cpu.dmem.read(addr)
+            values.append(hex32(val))
         
     return MemoryPageResponse(
         start_addr=hex32(start_val),
@@ -1,10 +1,6 @@
-
-from functools import total_ordering
-from enum import Enum
-from .util.type import Word, Half, Byte
-
-@total_ordering
-class Stage(Enum):
+class Stage:
+    """Pipeline stages as plain ints, so comparisons and slot indexing stay cheap"""
+    # consecutive in pipeline order, Packet.advance steps a stage with += 1
     BEGIN = 0 # means register unused, for tuse 
     IF = 1
     ID = 2
@@ -13,29 +9,4 @@ class Stage(Enum):
     WB = 5
     END = 6 # means register unwritten, for tnew
 
-    def __le__(self, other):
-        return self.value <= other.value
-    
-    def __eq__(self, other):
-        return self.value == other.value
-
-    def __hash__(self):
-        return hash(self.value)
-
-    def __sub__(self, other):
-        return self.value - other.value
-
-PIPELINE = {
-    Stage.BEGIN: Stage.IF,
-    Stage.IF: Stage.ID,
-    Stage.ID: Stage.EX,
-    Stage.EX: Stage.MEM,
-    Stage.MEM: Stage.WB,
-    Stage.WB: Stage.END,
-}
-
-class StallException(Exception):
-    def __init__(self, reason: str, reg: int = 0, producer_stage: str = ""):
-        self.reason = reason
-        self.reg = reg
-        self.producer_stage = producer_stage
\ No newline at end of file
+STAGE_NAMES = ('BEGIN', 'IF', 'ID', 'EX', 'MEM', 'WB', 'END')
@@ -1,21 +1,26 @@
-from dataclasses import dataclass, asdict, field
-from enum import Enum
-from typing import Optional, Dict, Any, List
-
-from pydantic.type_adapter import P
+from dataclasses import dataclass, field, fields
+from typing import Optional, Dict, List, Tuple
 
 from .util.type import hex32
-from .base import Stage, PIPELINE
 
-@dataclass
+# field names per behavior class, resolved on first to_dict
+_FIELD_NAMES: Dict[type, Tuple[str, ...]] = {}
+
+@dataclass(slots=True)
 class Behavior:
     """base behavior"""
     cycle: int
     pc: int
 
     def to_dict(self):
-        d = asdict(self)
-        d["type"] = self.__class__.__name__
+        # all fields are primitives (or fresh lists), so a shallow dict is enough,
+        # asdict would deep-copy every value on this per-cycle path
+        cls = self.__class__
+        names = _FIELD_NAMES.get(cls)
+        if names is None:
+            names = _FIELD_NAMES[cls] = tuple(f.name for f in fields(cls))
+        d = {name: getattr(self, name) for name in names}
+        d["type"] = cls.__name__
         d["pc"] = hex32(self.pc)
         return d
 
@@ -26,7 +31,7 @@ class Behavior:
         return f"{prefix}{hex32(self.pc)}: {self}"
 
 
-@dataclass
+@dataclass(slots=True)
 class StageStatus(Behavior):
     """pipeline status"""
     name: str          # IF, ID, etc.
@@ -58,7 +63,7 @@ class StageStatus(Behavior):
 #     val: int
 #     stage: str
 
-@dataclass
+@dataclass(slots=True)
 class RegWriteBehavior(Behavior):
     """register write back"""
     reg: int
@@ -70,7 +75,7 @@ class RegWriteBehavior(Behavior):
         # $ 2 <= 000000ff
         return f"${self.reg:2d} <= {hex32(self.val)}"
 
-@dataclass
+@dataclass(slots=True)
 class ForwardBehavior(Behavior):
     """forward behavior"""
     reg: int
@@ -89,7 +94,7 @@ class ForwardBehavior(Behavior):
 #     addr: int
 #     val: int
 
-@dataclass
+@dataclass(slots=True)
 class MemWriteBehavior(Behavior):
     """memory write back"""
     addr: int
@@ -101,7 +106,7 @@ class MemWriteBehavior(Behavior):
         # *00001000 <= 000000ff
         return f"*{self.addr:08x} <= {hex32(self.val)}"
 
-@dataclass
+@dataclass(slots=True)
 class StallBehavior(Behavior):
     """stall behavior"""
     producer_stage: str  # stall source
@@ -112,7 +117,7 @@ class StallBehavior(Behavior):
         # EX ---x---> ID ($ 8)
         return f"{self.producer_stage} ---x---> {self.consumer_stage} ($ {self.reg})"
 
-@dataclass
+@dataclass(slots=True)
 class BranchBehavior(Behavior):
     """branch behavior"""
     target_pc: int
@@ -1,14 +1,24 @@
-from subprocess import PIPE
-from typing import List, Dict, Optional, Any
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Dict, Optional, Any, Set, Tuple
 from dataclasses import dataclass, asdict
-from .base import PIPELINE, Stage, StallException, Word, Byte, Half
-from .util.type import to_word, to_byte, to_half, hex32
+from .base import STAGE_NAMES, Stage
+from .util.type import hex32
 from .behaviors import Behavior, StageStatus, RegWriteBehavior, MemWriteBehavior, BranchBehavior, StallBehavior
 from .pipeline import Pool
 from .mips.isa import Instruction, Packet, decode
 from .mips.set import Bubble 
 
-@dataclass
+# Integer slot indices for the pipeline registers, hoisted out of the per-cycle path
+IF, ID, EX, MEM, WB = Stage.IF, Stage.ID, Stage.EX, Stage.MEM, Stage.WB
+_STAGES = (IF, ID, EX, MEM, WB)
+# Stages whose packet may still owe a register write, nearest to ID first
+_PRODUCER_STAGES = (EX, MEM, WB)
+# Instructions are stateless, so every stall can share one bubble
+_BUBBLE = Bubble(0)
+
+@dataclass(slots=True)
 class Snapshot:
     """
     snapshot for pipeline cpu at each cycle
@@ -92,46 +102,54 @@ class Timer:
 class RegisterFile:
     def __init__(self, cpu):
         self.cpu = cpu
-        self.regs = [Word(0) for _ in range(32)]
+        self.regs = array('I', [0]) * 32 # unboxed 32-bit words, like imem
 
-    def __getitem__(self, key: int) -> Word:
+    def __getitem__(self, key: int) -> int:
         return self.regs[key]
 
-    def __setitem__(self, key: int, value: Word):
+    def __setitem__(self, key: int, value: int):
         self.regs[key] = value
 
     def __iter__(self):
         return iter(self.regs)
 
-    def copy(self):
-        return self.regs.copy()
+    def copy(self) -> List[int]:
+        return self.regs.tolist()
 
-    def read(self, reg_id: int) -> Word:
-        val = self.regs[reg_id]
-        return val
+    def read(self, reg_id: int) -> int:
+        return self.regs[reg_id]
 
-    def write(self, reg_id: int, change, pc: int):
-        data = change.new
-        # ugly
-        # because read_reg will not actually stall pipeline now, so when we use read_reg fetch origin value of a register, it may be old(that in RegisterFile, not new value in pipline), thus the change.origin.value is useless
-        # so we dont use the change.origin.value, but actually read from RegisterFile
+    def write(self, reg_id: int, data: int, pc: int, reason: str = ""):
+        # origin is read from RegisterFile at write back time, a value captured earlier
+        # in the pipeline may be stale (read_reg does not stall)
         if reg_id != 0:
-            origin_val = self.regs[reg_id].value
+            origin_val = self.regs[reg_id]
             self.regs[reg_id] = data
+            if self.cpu.log_writes:
+                self.cpu.reg_writes.append((self.cpu.cycle, reg_id, data))
             self.cpu.log_behavior(RegWriteBehavior(
                 self.cpu.cycle, 
                 pc, 
                 reg_id, 
-                data.value, 
-                # origin=change.origin.value, error !!!
+                data, 
                 origin=origin_val,
-                reason=change.reason
+                reason=reason
             ))
 
+# Memory is paged: 4KB pages of 1024 words, allocated on first store
+PAGE_SHIFT = 12
+PAGE_WORDS = 1 << (PAGE_SHIFT - 2)
+_WORD_IN_PAGE = PAGE_WORDS - 1
+
 class Memory:
     def __init__(self, cpu):
         self.cpu = cpu
-        self.data: Dict[int, Word] = {}
+        # aligned words live in unboxed pages keyed by address >> PAGE_SHIFT,
+        # unaligned addresses fall back to the sparse dict
+        self.pages: Dict[int, array] = {}
+        # aligned addresses ever stored to, so copy() keeps words stored as zero
+        self.stored: Set[int] = set()
+        self.data: Dict[int, int] = {}
         self.timers = {
             "Timer 0": Timer(cpu, 0x7F00),
             "Timer 1": Timer(cpu, 0x7F10)
@@ -144,27 +162,56 @@ class Memory:
             return self.timers["Timer 1"]
         return None
 
-    def read(self, addr: int) -> Word:
+    def read(self, addr: int) -> int:
         timer = self._get_timer_for_addr(addr)
         if timer:
-            return Word(timer.read(addr))
+            return timer.read(addr)
 
-        val = self.data.get(int(addr), 0)
+        val = self.load_w(addr)
 
         # Check if address is in text segment (code)
         if self.is_text_segment(addr):
             # Return instruction from imem
             idx = (addr - 0x3000) // 4
             if 0 <= idx < len(self.cpu.imem):
-                return Word(self.cpu.imem[idx])
+                return self.cpu.imem[idx]
 
-        return to_word(val)
+        return val
 
     def get(self, addr, default=0):
+        if not addr & 3:
+            if addr not in self.stored:
+                return default
+            return self.pages[addr >> PAGE_SHIFT][(addr >> 2) & _WORD_IN_PAGE]
         return self.data.get(addr, default)
 
-    def copy(self):
-        return self.data.copy()
+    def load_w(self, addr: int) -> int:
+        """Raw word read, no timer or text segment handling"""
+        if not addr & 3:
+            page = self.pages.get(addr >> PAGE_SHIFT)
+            return 0 if page is None else page[(addr >> 2) & _WORD_IN_PAGE]
+        return self.data.get(addr, 0)
+
+    def store_w(self, addr: int, val: int):
+        """Raw word write, no timer or text segment handling and no behavior logged"""
+        if not addr & 3:
+            page = self.pages.get(addr >> PAGE_SHIFT)
+            if page is None:
+                page = self.pages[addr >> PAGE_SHIFT] = array('I', [0]) * PAGE_WORDS
+            page[(addr >> 2) & _WORD_IN_PAGE] = val & 0xFFFFFFFF
+            self.stored.add(addr)
+        else:
+            self.data[addr] = val & 0xFFFFFFFF
+
+    def copy(self) -> Dict[int, int]:
+        """Every word ever stored, including zeros, as {addr: value}"""
+        pages = self.pages
+        mem = {
+            addr: pages[addr >> PAGE_SHIFT][(addr >> 2) & _WORD_IN_PAGE]
+            for addr in sorted(self.stored)
+        }
+        mem.update(self.data)
+        return mem
 
     def is_text_segment(self, addr: int) -> bool:
         """检查地址是否在代码段范围内"""
@@ -172,44 +219,72 @@ class Memory:
         TEXT_END = TEXT_START + len(self.cpu.imem) * 4
         return TEXT_START <= addr < TEXT_END
 
-    def write(self, addr: int, change, pc: int):
-        data = change.new
-        iaddr = int(addr)
+    def write(self, addr: int, data: int, pc: int, reason: str = "mem_write"):
+        origin = self.read(addr)
 
-        timer = self._get_timer_for_addr(iaddr)
+        timer = self._get_timer_for_addr(addr)
         if timer:
-            timer.write(iaddr, data.value)
+            timer.write(addr, data)
             self.cpu.log_behavior(MemWriteBehavior(
-                self.cpu.cycle, pc, iaddr, data.value,
-                origin=change.origin.value, reason=change.reason
+                self.cpu.cycle, pc, addr, data,
+                origin=origin, reason=reason
             ))
             return
 
-        if self.is_text_segment(iaddr):
+        if self.is_text_segment(addr):
             self.cpu.log_behavior(MemWriteBehavior(
-                self.cpu.cycle, pc, iaddr, data.value,
-                origin=change.origin.value, reason="text_segment_write_blocked"
+                self.cpu.cycle, pc, addr, data,
+                origin=origin, reason="text_segment_write_blocked"
             ))
             return
-        self.data[iaddr] = data
+        self.store_w(addr, data)
+        if self.cpu.log_writes:
+            self.cpu.mem_writes.append((self.cpu.cycle, addr, data))
         self.cpu.log_behavior(MemWriteBehavior(
-            self.cpu.cycle, pc, iaddr, data.value,
-            origin=change.origin.value, reason=change.reason
+            self.cpu.cycle, pc, addr, data,
+            origin=origin, reason=reason
         ))
 
+# "delta": history keeps pipeline/behaviors only, registers and memory are rebuilt
+#          from the write logs by get_snapshot
+# "full":  every history entry also carries its formatted registers and memory
+# "off":   no history at all, for batch runs that only want the final state
+SNAPSHOT_MODES = ("delta", "full", "off")
+
 class CPU:
-    def __init__(self, machine_codes: List[int]):
+    def __init__(self, machine_codes: List[int], snapshot_mode: str = "delta"):
+        if snapshot_mode not in SNAPSHOT_MODES:
+            raise ValueError(f"Unknown snapshot mode: {snapshot_mode}")
+        self.snapshot_mode = snapshot_mode
+        # only "delta" rebuilds state from the write logs, other modes skip keeping them
+        self.log_writes = snapshot_mode == "delta"
         self.pc = 0x3000 - 4
         self.regs: RegisterFile = RegisterFile(self)
-        self.imem = machine_codes
+        self.imem = array('I', machine_codes) # unboxed 32-bit words
+        # Instructions hold no per-execution state (that lives on Packet), so each
+        # word is decoded once here and the same object is reused on every fetch
+        self.decoded_instrs: List[Instruction] = [
+            decode(mc, 0x3000 + i * 4) for i, mc in enumerate(machine_codes)
+        ]
         self.dmem: Memory = Memory(self)
         self.cycle = 0
-        self.slots: Dict[Stage, Optional[Packet]] = {s: None for s in Stage}
-        self.shadows: Dict[Stage, Optional[Packet]] = {s: None for s in Stage}
+        # indexed by Stage
+        self.slots: List[Optional[Packet]] = [None] * len(STAGE_NAMES)
+        self.shadows: List[Optional[Packet]] = [None] * len(STAGE_NAMES)
+        # wreg -> stages producing it this cycle, nearest first (see step)
+        self._fwd: Dict[int, Tuple[int, ...]] = {}
         self.pool: Pool = Pool(self)
         
         self.current_behaviors: List[Behavior] = []
         self.history: List[Snapshot] = []
+
+        # register/memory state is not copied into every snapshot, instead the
+        # initial state and a (cycle, reg/addr, value) log of writes are kept
+        # and replayed by reconstruct_state
+        self.base_regs: List[int] = []
+        self.base_memory: Dict[int, int] = {}
+        self.reg_writes: List[Tuple[int, int, int]] = []
+        self.mem_writes: List[Tuple[int, int, int]] = []
         self.__pre_load()
 
     def __pre_load(self):
@@ -219,7 +294,7 @@ class CPU:
         self.current_behaviors.append(b)
 
     def _is_pipeline_empty(self) -> bool:
-        for s in self.slots.values():
+        for s in self.slots:
             if s is not None:
                 return False
         return True
@@ -230,19 +305,51 @@ class CPU:
 
     def _is_last_snapshot_empty(self) -> bool:
         """Check if the last snapshot shows an empty pipeline"""
-        if not self.history:
+        # the snapshot pipeline is built from shadows, checking them directly
+        # also works when snapshot_mode is "off"
+        if self.cycle == 0:
             return False
-        last_snap = self.history[-1]
-        for stage_info in last_snap["pipeline"].values():
-            if stage_info is not None:
+        for s in _STAGES:
+            if self.shadows[s] is not None:
                 return False
         return True
 
+    def is_finished(self) -> bool:
+        # Only finished when: PC out of bounds, pipeline empty, AND last snapshot shows empty pipeline
+        # This allows user to step one more time after pipeline becomes empty
+        return self._is_pc_out_of_bounds() and self._is_pipeline_empty() and self._is_last_snapshot_empty()
+
+    def run(self, max_cycles: int) -> int:
+        """
+        Step until the program finishes or max_cycles is reached, return the number of cycles run.
+        Batch entry point for long simulations: the loop stays in one frame with its lookups hoisted
+        """
+        step = self.step
+        is_finished = self.is_finished
+        for n in range(max_cycles):
+            if is_finished():
+                return n
+            step()
+        return max_cycles
+
     def step(self):
+        if self.cycle == 0 and self.log_writes:
+            # initial registers/memory may be preloaded after __init__
+            self.base_regs = self.regs.copy()
+            self.base_memory = self.dmem.copy()
         self.cycle += 1
         curpc = self.pc
         self.current_behaviors = []
-        self.shadows = self.slots.copy()
+        self.shadows = shadows = self.slots[:]
+        # producers are fixed for the whole cycle, so find them once here rather than
+        # rescanning the slots on every operand read
+        fwd = {}
+        for s in _PRODUCER_STAGES:
+            p = shadows[s]
+            if p is not None and p.instr.wreg:
+                wreg = p.instr.wreg
+                fwd[wreg] = fwd.get(wreg, ()) + (s,)
+        self._fwd = fwd
             
         self._stage_wb()
         self._stage_mem()
@@ -253,113 +360,115 @@ class CPU:
         for timer in self.dmem.timers.values():
             timer.step()
             
-        self.capture_snapshot(curpc)
+        if self.snapshot_mode != "off":
+            self.capture_snapshot(curpc)
 
     def _stage_wb(self):
-        p = self.slots[Stage.WB]
+        p = self.slots[WB]
         if not p: return
-        for reg_id, change in p.alu.items():
-            self.regs.write(reg_id, change, p.pc)
-        self.slots[Stage.WB] = None
+        if p.alu_reg >= 0:
+            self.regs.write(p.alu_reg, p.alu_new, p.pc, p.alu_reason)
+        self.slots[WB] = None
 
     def _stage_mem(self):
-        p = self.slots[Stage.MEM]
+        p = self.slots[MEM]
         if p:
             p.advance()
-            p.instr.execute(p)
-            for addr, change in p.mem.items():
-                self.dmem.write(addr, change, p.pc)
-            self.slots[Stage.WB] = p
-            self.slots[Stage.MEM] = None
+            if p.instr._has_mem:
+                p.instr.execute_mem(p)
+            if p.mem_addr >= 0:
+                self.dmem.write(p.mem_addr, p.mem_val, p.pc)
+            self.slots[WB] = p
+            self.slots[MEM] = None
 
     def _stage_ex(self):
-        p = self.slots[Stage.EX]
+        p = self.slots[EX]
         if p:
             p.advance()
-            p.instr.execute(p)
-            self.slots[Stage.MEM] = p
-            self.slots[Stage.EX] = None
+            if p.instr._has_ex:
+                p.instr.execute_ex(p)
+            self.slots[MEM] = p
+            self.slots[EX] = None
 
     def _stage_id(self):
-        p_id = self.slots[Stage.ID]
+        p_id = self.slots[ID]
         if p_id:
-            try:
-                self.pool.check_stall(p_id)
-                if p_id.stage == Stage.IF:
-                    p_id.advance()
-                p_id.instr.execute(p_id)
-                if p_id.npc != p_id.pc + 4:
-                    self.pc = p_id.npc - 4 # IF will add 4
-                    self.log_behavior(BranchBehavior(self.cycle, p_id.pc, p_id.npc, taken=True))
-                self.slots[Stage.EX] = p_id
-                self.slots[Stage.ID] = None
-                
-            except StallException as e:
+            hazard = self.pool.check_stall(p_id)
+            if hazard is not None:
+                reg, producer_stage = hazard
                 self.log_behavior(StallBehavior(
                     self.cycle, p_id.pc,
-                    producer_stage=e.producer_stage,
+                    producer_stage=producer_stage,
                     consumer_stage="ID",
-                    reg=e.reg
+                    reg=reg
                 ))
-                bubble_pkt = Packet(pool=self.pool, pc=0, instr=Bubble(0))
-                bubble_pkt.stage = Stage.EX
-                self.slots[Stage.EX] = bubble_pkt
+                bubble_pkt = Packet(pool=self.pool, pc=0, instr=_BUBBLE)
+                bubble_pkt.stage = EX
+                self.slots[EX] = bubble_pkt
                 return # Do not pull from IF
-        if self.slots[Stage.ID] is None:
-            p_if = self.slots[Stage.IF]
+
+            if p_id.stage == IF:
+                p_id.advance()
+            if p_id.instr._has_id:
+                p_id.instr.execute_id(p_id)
+            if p_id.npc != p_id.pc + 4:
+                self.pc = p_id.npc - 4 # IF will add 4
+                self.log_behavior(BranchBehavior(self.cycle, p_id.pc, p_id.npc, taken=True))
+            self.slots[EX] = p_id
+            self.slots[ID] = None
+        if self.slots[ID] is None:
+            p_if = self.slots[IF]
             if p_if:
-                self.slots[Stage.ID] = p_if
-                if p_if.stage == Stage.IF:
+                self.slots[ID] = p_if
+                if p_if.stage == IF:
                     p_if.advance()
-                self.slots[Stage.IF] = None
+                self.slots[IF] = None
 
     def _stage_if(self):
-        if self.slots[Stage.IF] is None:
+        if self.slots[IF] is None:
             self.pc += 4
             fetch_pc = self.pc
             
             # Fetch
             idx = (fetch_pc - 0x3000) // 4
             if 0 <= idx < len(self.imem):
-                instr_code = self.imem[idx]
-                instr = decode(instr_code, fetch_pc)
+                instr = self.decoded_instrs[idx]
                 pkt = Packet(pool=self.pool, pc=fetch_pc, instr=instr)
-                pkt.stage = Stage.IF 
-                self.slots[Stage.IF] = pkt
+                pkt.stage = IF
+                self.slots[IF] = pkt
             else:
-                self.slots[Stage.IF] = None
+                self.slots[IF] = None
 
     def capture_snapshot(self, cur_pc: int):
         pipeline_snap = {}
 
+        # one pass over this cycle's behaviors for all the stall flags
         stall_srcs = set()
+        id_stalled = False
         for b in self.current_behaviors:
             if isinstance(b, StallBehavior):
                 stall_srcs.add(b.producer_stage)
+                if b.consumer_stage == "ID":
+                    id_stalled = True
 
-        s = Stage.IF
-        while s != Stage.END:
+        for s in _STAGES:
+            name = STAGE_NAMES[s]
             p = self.shadows[s]
             if p:
                 is_bubble = isinstance(p.instr, Bubble)
-                is_stall = False
-                if s == Stage.ID:
-                    for b in self.current_behaviors:
-                        if isinstance(b, StallBehavior) and b.consumer_stage == "ID":
-                            is_stall = True
-                            break
-                is_stall_src = s.name in stall_srcs
+                is_stall = id_stalled and s == ID
+                is_stall_src = name in stall_srcs
                 tuse_rs = p.instr.tuse_rs_remaining(s)
                 tuse_rt = p.instr.tuse_rt_remaining(s)
                 tnew = p.instr.tnew_remaining(s)
-                wreg = p.instr.get_wreg()
+                wreg = p.instr.wreg
                 rregs = p.instr.get_rregs()
-                pipeline_snap[s.name] = StageStatus(
+                pipeline_snap[name] = StageStatus(
                     cycle=self.cycle,
                     pc=p.pc,
-                    name=s.name,
-                    instr=p.instr.disassemble(p.pc),
-                    render_str=p.instr.render_str(p.pc),
+                    name=name,
+                    instr=p.instr._disasm,
+                    render_str=p.instr._render,
                     rs=p.instr.rs,
                     rt=p.instr.rt,
                     rd=p.instr.rd,
@@ -374,8 +483,7 @@ class CPU:
                     is_stall_src=is_stall_src
                 ).to_dict()
             else:
-                pipeline_snap[s.name] = None
-            s = PIPELINE[s]
+                pipeline_snap[name] = None
 
         timers_snap = {}
         for name, timer in self.dmem.timers.items():
@@ -385,12 +493,97 @@ class CPU:
                 "count": hex32(timer.count)
             }
 
-        self.history.append({
+        snap = {
             "cycle": self.cycle,
             "pc": hex32(cur_pc),
-            "gpr": [hex32(r.value) for r in self.regs],
-            "memory": {hex32(addr): hex32(val.value) for addr, val in self.dmem.copy().items()},
             "timers": timers_snap,
             "pipeline": pipeline_snap,
-            "behaviors": self.current_behaviors.copy(),
-        })
\ No newline at end of file
+            # step() starts a fresh list every cycle, so this one can be kept as is
+            "behaviors": self.current_behaviors,
+        }
+        if self.snapshot_mode == "full":
+            snap["gpr"] = [hex32(val) for val in self.regs.regs]
+            snap["memory"] = {hex32(addr): hex32(val) for addr, val in self.dmem.copy().items()}
+        self.history.append(snap)
+
+    def reconstruct_state(self, cycle: int) -> Tuple[List[int], Dict[int, int]]:
+        """Replay the write logs to get (registers, memory) as they were at the end of cycle"""
+        if not self.log_writes:
+            raise ValueError(f"Write logs are not kept in \"{self.snapshot_mode}\" snapshot mode")
+        if self.cycle == 0:
+            return self.regs.copy(), self.dmem.copy()
+
+        regs = self.base_regs.copy()
+        for c, reg_id, val in self.reg_writes:
+            if c > cycle:
+                break
+            regs[reg_id] = val
+
+        memory = self.base_memory.copy()
+        for c, addr, val in self.mem_writes:
+            if c > cycle:
+                break
+            memory[addr] = val
+        return regs, memory
+
+    def get_snapshot(self, index: int) -> Dict[str, Any]:
+        """Return history[index] completed with its formatted register and memory state"""
+        snap = self.history[index]
+        if "gpr" in snap: # captured in "full" mode
+            return snap
+        regs, memory = self.reconstruct_state(snap["cycle"])
+        return {
+            **snap,
+            "gpr": [hex32(val) for val in regs],
+            "memory": {hex32(addr): hex32(val) for addr, val in memory.items()},
+        }
+
+    def get_snapshots(self) -> List[Dict[str, Any]]:
+        """
+        Every history entry completed like get_snapshot, in order.
+        The write logs are replayed once across the whole history instead of
+        from the start for each entry
+        """
+        if not self.log_writes:
+            return [self.get_snapshot(i) for i in range(len(self.history))]
+
+        gpr = [hex32(val) for val in self.base_regs]
+        memory = {hex32(addr): hex32(val) for addr, val in self.base_memory.items()}
+        reg_writes, mem_writes = self.reg_writes, self.mem_writes
+        ri = mi = 0
+        snaps = []
+        for snap in self.history:
+            cycle = snap["cycle"]
+            while ri < len(reg_writes) and reg_writes[ri][0] <= cycle:
+                _, reg_id, val = reg_writes[ri]
+                gpr[reg_id] = hex32(val)
+                ri += 1
+            while mi < len(mem_writes) and mem_writes[mi][0] <= cycle:
+                _, addr, val = mem_writes[mi]
+                memory[hex32(addr)] = hex32(val)
+                mi += 1
+            snaps.append({**snap, "gpr": gpr.copy(), "memory": memory.copy()})
+        return snaps
+
+
+def simulate(machine_codes: List[int], max_cycles: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Run one program until it finishes or max_cycles, return its full snapshots.
+    Module level and returning plain data, so it can be mapped over a process pool
+    """
+    cpu = CPU(machine_codes)
+    cpu.run(max_cycles)
+    return cpu.get_snapshots()
+
+def simulate_many(
+    programs: List[List[int]],
+    max_cycles: int = 1000,
+    max_workers: Optional[int] = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Run independent programs in parallel, results in the same order as programs.
+    Uses processes, not threads: every simulated step holds the GIL, so threads
+    would only run the programs one after another
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(simulate, programs, repeat(max_cycles)))
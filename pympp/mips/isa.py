@@ -1,22 +1,21 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
-from struct import pack
-from typing import Optional, Dict, Any, Type, List
-from pydantic import BaseModel
+from typing import Optional, Dict, Type, List
 
-from ..util.type import Word, to_word
-from ..behaviors import Behavior
-from ..pipeline import PIPELINE, Pool, Stage
+from ..base import Stage
+from ..pipeline import Pool
 
 INSTRUCTION_REGISTRY: Dict[tuple, Type['Instruction']] = {}
+# Flat decode tables: OPCODE_TABLE[opcode] for I/J-type, FUNCT_TABLE[funct] for R-type (opcode == 0)
+OPCODE_TABLE: List[Optional[Type['Instruction']]] = [None] * 64
+FUNCT_TABLE: List[Optional[Type['Instruction']]] = [None] * 64
 
 # Help registry
 def instr(
     opcode: int, 
     funct: Optional[int] = None,
-    tuse_rs: Stage = Stage.BEGIN, # default not use register rs
-    tuse_rt: Stage = Stage.BEGIN, # default not use register rt
-    tnew: Stage = Stage.END, # default not write register
+    tuse_rs: int = Stage.BEGIN, # default not use register rs
+    tuse_rt: int = Stage.BEGIN, # default not use register rt
+    tnew: int = Stage.END, # default not write register
     asm_type: str = None,  # Instruction type: R/I/B/J
     asm_template: str = None,  # Assembly template e.g., "add $rd, $rs, $rt"
     asm_encoding: str = None,  # Binary encoding pattern
@@ -25,9 +24,16 @@ def instr(
     def wrapper(cls):
         key = (opcode, funct) if opcode == 0 else (opcode, None)
         INSTRUCTION_REGISTRY[key] = cls
+        if opcode == 0:
+            FUNCT_TABLE[funct] = cls
+        else:
+            OPCODE_TABLE[opcode] = cls
         cls._meta_tuse_rs = tuse_rs
         cls._meta_tuse_rt = tuse_rt
         cls._meta_tnew = tnew
+        # cycles an operand read in ID may still wait, as compared against Tnew in hazard checks
+        cls._tuse_rs_delta = max(0, tuse_rs - Stage.ID)
+        cls._tuse_rt_delta = max(0, tuse_rt - Stage.ID)
         
         # Add assembler metadata
         cls._asm_type = asm_type
@@ -40,108 +46,122 @@ def instr(
 
 def decode(machine_code: int, pc: int) -> 'Instruction':
     opcode = (machine_code >> 26) & 0x3F
-    funct = machine_code & 0x3F
-    key = (opcode, funct) if opcode == 0 else (opcode, None)
-    instr_cls = INSTRUCTION_REGISTRY.get(key)
+    instr_cls = FUNCT_TABLE[machine_code & 0x3F] if opcode == 0 else OPCODE_TABLE[opcode]
     
     if not instr_cls:
-        instr_cls = INSTRUCTION_REGISTRY.get((0, 0)) 
+        instr_cls = FUNCT_TABLE[0] # sll, i.e. nop
         if not instr_cls:
             raise ValueError(f"Unknown instruction: {hex(machine_code)}")
             
-    return instr_cls(machine_code)
+    return instr_cls(machine_code, pc)
 
-@dataclass
-class Change:
-    origin: Word
-    new: Word
-    reason: str
-
-PENDING = Change(origin=to_word(-1), new=to_word(-1), reason="pending")
-
-@dataclass
 class Packet:
     """
-    Packet describe the behavior the instruction do for pipeline
+    Packet describe the behavior the instruction do for pipeline.
+    An instruction writes at most one register and one memory word, so the
+    pending writes are kept as plain fields rather than per-packet dicts
     """
-    pool: Pool
-
-    pc: int
-    instr: Type['Instruction']
-    npc: int = None
-    stage: Stage = Stage.IF
-    
-    alu: Dict[int, Change] = field(default_factory=dict)
-    mem: Dict[int, Change] = field(default_factory=dict)
-
-    optional: Dict[str, Any] = field(default_factory=dict) # extra data for Packet
+    __slots__ = (
+        'pool', 'read_reg', 'pc', 'instr', 'npc', 'stage',
+        'alu_reg', 'alu_new', 'alu_reason',
+        'mem_addr', 'mem_val', 'mem_ea',
+    )
 
-    def __post_init__(self):
-        if self.npc is None:
-            self.npc = self.pc + 4
+    def __init__(
+        self,
+        pool: Pool,
+        pc: int,
+        instr: 'Instruction',
+        npc: int = None,
+        stage: int = Stage.IF,
+    ):
+        self.pool = pool
+        # operand fetch bound once per packet, execute hooks call packet.read_reg directly
+        self.read_reg = pool.read_reg
+        self.pc = pc
+        self.instr = instr
+        self.npc = pc + 4 if npc is None else npc
+        self.stage = stage
+
+        # register write, consumed by WB and forwarding; alu_reg is -1 until written
+        self.alu_reg: int = -1
+        self.alu_new: int = 0
+        self.alu_reason: str = ""
+
+        # memory write, consumed by MEM; mem_addr is -1 until written
+        self.mem_addr: int = -1
+        self.mem_val: int = 0
+        # effective address computed in EX by lw/sw, used again in MEM
+        self.mem_ea: int = 0
 
     def advance(self):
-        self.stage = PIPELINE[self.stage]
+        # a packet leaves the pipeline after WB, so it never advances past END
+        self.stage += 1
 
 class Instruction(ABC):
+    # Decoded fields are plain slots filled once in __init__, they are read
+    # several times per cycle by hazard detection, forwarding and execute
+    __slots__ = (
+        'raw', 'opcode', 'rs', 'rt', 'rd', 'shamt', 'funct',
+        'imm16', 'imm16_signed', 'imm26',
+        'tuse_rs', 'tuse_rt', 'tnew', 'wreg',
+        '_disasm', '_render',
+    )
+
+    # whether each per-stage hook does any work, fixed per class
+    _has_id = False
+    _has_ex = False
+    _has_mem = False
+    # set by @instr
+    _tuse_rs_delta = 0
+    _tuse_rt_delta = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # resolved once per instruction class, the CPU then skips calling
+        # hooks that are still the no-op defaults
+        cls._has_id = cls.execute_id is not Instruction.execute_id
+        cls._has_ex = cls.execute_ex is not Instruction.execute_ex
+        cls._has_mem = cls.execute_mem is not Instruction.execute_mem
+
     def __init__(
         self, 
         machine_code: int,
+        pc: int = None,
         ):
         self.raw = machine_code
-        self._tuse_rs = getattr(self, '_meta_tuse_rs', Stage.BEGIN)
-        self._tuse_rt = getattr(self, '_meta_tuse_rt', Stage.BEGIN)
-        self._tnew = getattr(self, '_meta_tnew', 0)
-
-    @property
-    def tuse_rs(self) -> Stage: return self._tuse_rs
-
-    @property
-    def tuse_rt(self) -> Stage: return self._tuse_rt
-
-    @property
-    def tnew(self) -> Stage: return self._tnew
-
-    def tuse_rs_remaining(self, stage: Stage) -> int:
-        _r = self._tuse_rs - stage
-        return max(0, _r)
+        self.opcode = (machine_code >> 26) & 0x3F
+        self.rs = (machine_code >> 21) & 0x1F
+        self.rt = (machine_code >> 16) & 0x1F
+        self.rd = (machine_code >> 11) & 0x1F
+        self.shamt = (machine_code >> 6) & 0x1F
+        self.funct = machine_code & 0x3F
+        imm16 = machine_code & 0xFFFF
+        self.imm16 = imm16
+        self.imm16_signed = imm16 - 65536 if imm16 & 0x8000 else imm16
+        self.imm26 = machine_code & 0x3FFFFFF
+
+        self.tuse_rs = getattr(self, '_meta_tuse_rs', Stage.BEGIN)
+        self.tuse_rt = getattr(self, '_meta_tuse_rt', Stage.BEGIN)
+        self.tnew = getattr(self, '_meta_tnew', 0)
+        self.wreg = self.get_wreg()
+
+        # an Instruction is immutable once decoded, so its text is formatted once
+        # here instead of in every snapshot it appears in
+        self._disasm = self.disassemble(pc)
+        self._render = self.render_str(pc)
+
+    def tuse_rs_remaining(self, stage: int) -> int:
+        _r = self.tuse_rs - stage
+        return _r if _r > 0 else 0
     
-    def tuse_rt_remaining(self, stage: Stage) -> int:
-        _r = self._tuse_rt - stage
-        return max(0, _r)
+    def tuse_rt_remaining(self, stage: int) -> int:
+        _r = self.tuse_rt - stage
+        return _r if _r > 0 else 0
 
-    def tnew_remaining(self, stage: Stage) -> int:
-        _r = self._tnew - stage
-        return max(0, _r)
-    
-    @property
-    def opcode(self) -> int: return (self.raw >> 26) & 0x3F
-
-    @property
-    def rs(self) -> int: return (self.raw >> 21) & 0x1F
-
-    @property
-    def rt(self) -> int: return (self.raw >> 16) & 0x1F
-
-    @property
-    def rd(self) -> int: return (self.raw >> 11) & 0x1F
-
-    @property
-    def funct(self) -> int: return self.raw & 0x3F
-    
-    @property
-    def shamt(self) -> int: return (self.raw >> 6) & 0x1F
-
-    @property
-    def imm16(self) -> int: return self.raw & 0xFFFF
-    
-    @property
-    def imm16_signed(self) -> int:
-        val = self.raw & 0xFFFF
-        return val - 65536 if val & 0x8000 else val
-
-    @property
-    def imm26(self) -> int: return self.raw & 0x3FFFFFF
+    def tnew_remaining(self, stage: int) -> int:
+        _r = self.tnew - stage
+        return _r if _r > 0 else 0
 
     @abstractmethod
     def get_wreg(self) -> Optional[int]: pass
@@ -149,9 +169,9 @@ class Instruction(ABC):
     def get_rregs(self) -> List[int]:
         """Return list of read registers (excluding $0)"""
         regs = []
-        if self._tuse_rs != Stage.BEGIN and self.rs != 0:
+        if self.tuse_rs != Stage.BEGIN and self.rs != 0:
             regs.append(self.rs)
-        if self._tuse_rt != Stage.BEGIN and self.rt != 0:
+        if self.tuse_rt != Stage.BEGIN and self.rt != 0:
             regs.append(self.rt)
         return regs
 
@@ -165,7 +185,12 @@ class Instruction(ABC):
         """
         return self.disassemble(pc)
 
-    # Must be implemented  
-    @abstractmethod
-    def execute(self, packet: Packet):
+    # Per-stage work, each called by the CPU only in its own stage; default does nothing
+    def execute_id(self, packet: Packet):
+        pass
+
+    def execute_ex(self, packet: Packet):
+        pass
+
+    def execute_mem(self, packet: Packet):
         pass
\ No newline at end of file
@@ -1,8 +1,7 @@
-from struct import pack
 from typing import Optional
-from .isa import instr, Instruction, Packet, Change
+from .isa import instr, Instruction, Packet
 from ..base import Stage
-from ..util.type import to_word, hex32
+from ..util.type import hex32
 
 # [
 #   add
@@ -28,6 +27,8 @@ from ..util.type import to_word, hex32
     asm_encoding='000000 sssss ttttt ddddd 00000 100000'
 )
 class Add(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return self.rd
     
@@ -37,12 +38,10 @@ class Add(Instruction):
     def render_str(self, pc: int = None):
         return f"add ${self.rd}|w, ${self.rs}|r, ${self.rt}|r"
 
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.EX:
-            return
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
-        rt_val = packet.pool.read_reg(self.rt, packet.stage)
-        packet.pool.write_reg(packet, self.rd, rs_val + rt_val, "add")
+    def execute_ex(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        rt_val = packet.read_reg(self.rt, packet.stage)
+        packet.pool.write_reg(packet, self.rd, (rs_val + rt_val) & 0xFFFFFFFF, "add")
 
 @instr(
     opcode=0, 
@@ -55,6 +54,8 @@ class Add(Instruction):
     asm_encoding='000000 sssss ttttt ddddd 00000 100010'
 )
 class Sub(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return self.rd
     
@@ -64,12 +65,10 @@ class Sub(Instruction):
     def render_str(self, pc: int = None):
         return f"sub ${self.rd}|w, ${self.rs}|r, ${self.rt}|r"
 
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.EX:
-            return
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
-        rt_val = packet.pool.read_reg(self.rt, packet.stage)
-        packet.pool.write_reg(packet, self.rd, rs_val - rt_val, "sub")
+    def execute_ex(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        rt_val = packet.read_reg(self.rt, packet.stage)
+        packet.pool.write_reg(packet, self.rd, (rs_val - rt_val) & 0xFFFFFFFF, "sub")
 
 @instr(
     opcode=0b001111, 
@@ -78,6 +77,8 @@ class Sub(Instruction):
     asm_template='$rt, imm',
     asm_encoding='001111 00000 ttttt iiiiiiiiiiiiiiii')
 class Lui(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return self.rt
 
@@ -87,10 +88,8 @@ class Lui(Instruction):
     def render_str(self, pc: int = None):
         return f"lui ${self.rt}|w, {hex(self.imm16)}"
 
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.EX:
-            return
-        result = self.imm16 << 16
+    def execute_ex(self, packet: Packet):
+        result = (self.imm16 << 16) & 0xFFFFFFFF
         packet.pool.write_reg(packet, self.rt, result, "lui")
 
 @instr(
@@ -102,6 +101,8 @@ class Lui(Instruction):
     asm_encoding='001101 sssss ttttt iiiiiiiiiiiiiiii'
 )
 class Ori(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return self.rt
     
@@ -111,10 +112,8 @@ class Ori(Instruction):
     def render_str(self, pc: int = None):
         return f"ori ${self.rt}|w, ${self.rs}|r, {hex(self.imm16)}"
 
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.EX:
-            return
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
+    def execute_ex(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
         result = rs_val | self.imm16
         packet.pool.write_reg(packet, self.rt, result, "ori")
 
@@ -128,6 +127,8 @@ class Ori(Instruction):
     asm_encoding='100011 sssss ttttt iiiiiiiiiiiiiiii'
 )
 class Lw(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return self.rt
 
@@ -137,15 +138,14 @@ class Lw(Instruction):
     def render_str(self, pc: int = None):
         return f"lw ${self.rt}|w, {self.imm16_signed}(${self.rs}|r)"
 
-    def execute(self, packet: Packet):
-        if packet.stage == Stage.EX:
-            rs_val = packet.pool.read_reg(self.rs, packet.stage)
-            addr = rs_val + self.imm16_signed
-            packet.optional["mem_addr"] = addr 
-        
-        elif packet.stage == Stage.MEM:
-            mem_val = packet.pool.read_mem(packet.optional["mem_addr"].value)
-            packet.pool.write_reg(packet, self.rt, mem_val, "lw")
+    def execute_ex(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        addr = (rs_val + self.imm16_signed) & 0xFFFFFFFF
+        packet.mem_ea = addr
+
+    def execute_mem(self, packet: Packet):
+        mem_val = packet.pool.read_mem(packet.mem_ea)
+        packet.pool.write_reg(packet, self.rt, mem_val, "lw")
 
 @instr(
     opcode=0b101011, 
@@ -156,6 +156,8 @@ class Lw(Instruction):
     asm_encoding='101011 sssss ttttt iiiiiiiiiiiiiiii'
 )
 class Sw(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return None
 
@@ -165,16 +167,15 @@ class Sw(Instruction):
     def render_str(self, pc: int = None):
         return f"sw ${self.rt}|r, {self.imm16_signed}(${self.rs}|r)"
 
-    def execute(self, packet: Packet):
-        if packet.stage == Stage.EX:
-            rs_val = packet.pool.read_reg(self.rs, packet.stage)
-            addr = rs_val + self.imm16_signed
-            packet.optional["mem_addr"] = addr
-        
-        elif packet.stage == Stage.MEM:
-            addr = packet.optional["mem_addr"].value
-            rt_val = packet.pool.read_reg(self.rt, packet.stage)
-            packet.pool.write_mem(packet, addr, rt_val)
+    def execute_ex(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        addr = (rs_val + self.imm16_signed) & 0xFFFFFFFF
+        packet.mem_ea = addr
+
+    def execute_mem(self, packet: Packet):
+        addr = packet.mem_ea
+        rt_val = packet.read_reg(self.rt, packet.stage)
+        packet.pool.write_mem(packet, addr, rt_val)
 
 
 @instr(
@@ -186,6 +187,8 @@ class Sw(Instruction):
     asm_encoding='000100 sssss ttttt iiiiiiiiiiiiiiii'
 )
 class Beq(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return None
 
@@ -196,11 +199,9 @@ class Beq(Instruction):
     def render_str(self, pc: int = None):
         return f"beq ${self.rs}|r, ${self.rt}|r, {self.imm16_signed}"
 
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.ID:
-            return
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
-        rt_val = packet.pool.read_reg(self.rt, packet.stage)
+    def execute_id(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        rt_val = packet.read_reg(self.rt, packet.stage)
         if rs_val == rt_val:
             packet.npc = packet.pc + 4 + (self.imm16_signed << 2)
 
@@ -213,6 +214,8 @@ class Beq(Instruction):
     asm_encoding='000000 sssss 00000 00000 00000 001000'
 )
 class Jr(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return None
 
@@ -222,12 +225,9 @@ class Jr(Instruction):
     def render_str(self, pc: int = None):
         return f"jr ${self.rs}|r"
 
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.ID:
-            return
-        
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
-        packet.npc = rs_val.value
+    def execute_id(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        packet.npc = rs_val
 
 @instr(
     opcode=0b000011, 
@@ -237,6 +237,8 @@ class Jr(Instruction):
     asm_encoding='000011 iiiiiiiiiiiiiiiiiiiiiiiiii'
 )
 class Jal(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return 31 # $ra register
 
@@ -253,12 +255,11 @@ class Jal(Instruction):
             return f"jal {hex32(target_addr)} (=$31|w)"
         return f"jal {hex32(self.imm26)} (=$31|w)"
 
-    def execute(self, packet: Packet):
-        if packet.stage == Stage.ID:
-            target_addr = (self.imm26 << 2) | ((packet.pc + 4) & 0xF0000000)
-            packet.npc = target_addr
-            return_addr = packet.pc + 8
-            packet.pool.write_reg(packet, 31, to_word(return_addr), "jal")
+    def execute_id(self, packet: Packet):
+        target_addr = (self.imm26 << 2) | ((packet.pc + 4) & 0xF0000000)
+        packet.npc = target_addr
+        return_addr = packet.pc + 8
+        packet.pool.write_reg(packet, 31, return_addr, "jal")
 
 @instr(
     opcode=0b000010,
@@ -267,6 +268,8 @@ class Jal(Instruction):
     asm_encoding='000010 iiiiiiiiiiiiiiiiiiiiiiiiii'
 )
 class J(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return None  # j doesn't write to any register
     
@@ -282,10 +285,9 @@ class J(Instruction):
             return f"j {hex32(target_addr)}"
         return f"j {hex32(self.imm26)}"
     
-    def execute(self, packet: Packet):
-        if packet.stage == Stage.ID:
-            target_addr = (self.imm26 << 2) | ((packet.pc + 4) & 0xF0000000)
-            packet.npc = target_addr
+    def execute_id(self, packet: Packet):
+        target_addr = (self.imm26 << 2) | ((packet.pc + 4) & 0xF0000000)
+        packet.npc = target_addr
 
 @instr(
     opcode=0b001000,
@@ -296,6 +298,8 @@ class J(Instruction):
     asm_encoding='001000 sssss ttttt iiiiiiiiiiiiiiii'
 )
 class Addi(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return self.rt
     
@@ -305,11 +309,9 @@ class Addi(Instruction):
     def render_str(self, pc: int = None):
         return f"addi ${self.rt}|w, ${self.rs}|r, {self.imm16_signed}"
     
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.EX:
-            return
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
-        result = rs_val + self.imm16_signed
+    def execute_ex(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        result = (rs_val + self.imm16_signed) & 0xFFFFFFFF
         packet.pool.write_reg(packet, self.rt, result, "addi")
 
 @instr(
@@ -323,6 +325,8 @@ class Addi(Instruction):
     asm_mnemonic='sll'
 )
 class Sll(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return self.rd if self.rd != 0 else None
     
@@ -337,14 +341,12 @@ class Sll(Instruction):
             return "nop"
         return f"sll ${self.rd}|w, ${self.rt}|r, {self.shamt}"
     
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.EX:
-            return
+    def execute_ex(self, packet: Packet):
         if self.rd == 0:  # nop case
             return
-        rt_val = packet.pool.read_reg(self.rt, packet.stage)
-        result = (rt_val.value << self.shamt) & 0xFFFFFFFF
-        packet.pool.write_reg(packet, self.rd, to_word(result), "sll")
+        rt_val = packet.read_reg(self.rt, packet.stage)
+        result = (rt_val << self.shamt) & 0xFFFFFFFF
+        packet.pool.write_reg(packet, self.rd, result, "sll")
 
 @instr(
     opcode=0b000110,
@@ -355,6 +357,8 @@ class Sll(Instruction):
     asm_mnemonic='blez'
 )
 class Blez(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return None
     
@@ -364,12 +368,10 @@ class Blez(Instruction):
     def render_str(self, pc: int = None):
         return f"blez ${self.rs}|r, {self.imm16_signed}"
     
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.ID:
-            return
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
+    def execute_id(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
         # Check if rs <= 0 (treating as signed)
-        if rs_val.value == 0 or (rs_val.value & 0x80000000):  # <= 0
+        if rs_val == 0 or (rs_val & 0x80000000):  # <= 0
             packet.npc = packet.pc + 4 + (self.imm16_signed << 2)
 
 @instr(
@@ -383,6 +385,8 @@ class Blez(Instruction):
     asm_encoding='000000 sssss ttttt ddddd 00000 101010'
 )
 class Slt(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return self.rd
 
@@ -392,13 +396,12 @@ class Slt(Instruction):
     def render_str(self, pc: int = None):
         return f"slt ${self.rd}|w, ${self.rs}|r, ${self.rt}|r"
 
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.EX:
-            return
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
-        rt_val = packet.pool.read_reg(self.rt, packet.stage)
-        result = 1 if rs_val.signed < rt_val.signed else 0
-        packet.pool.write_reg(packet, self.rd, to_word(result), "slt")
+    def execute_ex(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        rt_val = packet.read_reg(self.rt, packet.stage)
+        # flipping the sign bit maps signed order onto unsigned order
+        result = 1 if (rs_val ^ 0x80000000) < (rt_val ^ 0x80000000) else 0
+        packet.pool.write_reg(packet, self.rd, result, "slt")
 
 @instr(
     opcode=0b000111,
@@ -409,6 +412,8 @@ class Slt(Instruction):
     asm_mnemonic='bgtz'
 )
 class Bgtz(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return None
 
@@ -418,11 +423,9 @@ class Bgtz(Instruction):
     def render_str(self, pc: int = None):
         return f"bgtz ${self.rs}|r, {self.imm16_signed}"
 
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.ID:
-            return
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
-        if rs_val.signed > 0:
+    def execute_id(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        if rs_val and not rs_val & 0x80000000:  # > 0
             packet.npc = packet.pc + 4 + (self.imm16_signed << 2)
 
 @instr(
@@ -435,6 +438,8 @@ class Bgtz(Instruction):
     asm_mnemonic='bne'
 )
 class Bne(Instruction):
+    __slots__ = ()
+
     def get_wreg(self) -> Optional[int]:
         return None
 
@@ -444,24 +449,24 @@ class Bne(Instruction):
     def render_str(self, pc: int = None):
         return f"bne ${self.rs}|r, ${self.rt}|r, {self.imm16_signed}"
 
-    def execute(self, packet: Packet):
-        if packet.stage != Stage.ID:
-            return
-        rs_val = packet.pool.read_reg(self.rs, packet.stage)
-        rt_val = packet.pool.read_reg(self.rt, packet.stage)
+    def execute_id(self, packet: Packet):
+        rs_val = packet.read_reg(self.rs, packet.stage)
+        rt_val = packet.read_reg(self.rt, packet.stage)
         if rs_val != rt_val:
             packet.npc = packet.pc + 4 + (self.imm16_signed << 2)
 
 # Nop is an alias for sll $0, $0, 0
 class Nop(Sll):
     """Nop is just an alias for sll $0, $0, 0"""
-    def __init__(self, machine_code: int = 0):
-        super().__init__(machine_code)
+    __slots__ = ()
+
+    def __init__(self, machine_code: int = 0, pc: int = None):
+        super().__init__(machine_code, pc)
     
     def disassemble(self, pc: int = None) -> str:
         return "nop"
     
-    def execute(self, packet: Packet):
+    def execute_ex(self, packet: Packet):
         pass  # Does nothing
 
 # Manually set assembler metadata for nop
@@ -471,5 +476,7 @@ Nop._asm_encoding = '00000000000000000000000000000000'
 Nop._asm_mnemonic = 'nop'
 
 class Bubble(Sll):
+    __slots__ = ()
+
     def disassemble(self, pc: int = None) -> str:
         return "nop"
\ No newline at end of file
@@ -1,86 +1,67 @@
-from pympp.util.type import Word, to_word
-from .base import Stage, PIPELINE, StallException
-from .behaviors import ForwardBehavior, StallBehavior
+from typing import Optional, Tuple
+from .base import Stage, STAGE_NAMES
+from .behaviors import ForwardBehavior
 
 class Pool:
     def __init__(self, cpu):
         self.cpu = cpu
 
-    def check_stall(self, packet):
-        if packet.instr.tuse_rs != Stage.BEGIN:
-            self._detect_hazard(packet.instr.rs, packet.instr.tuse_rs)
-        if packet.instr.tuse_rt != Stage.BEGIN:
-            self._detect_hazard(packet.instr.rt, packet.instr.tuse_rt)
+    def check_stall(self, packet) -> Optional[Tuple[int, str]]:
+        """Return (reg, producer stage name) if packet must stall in ID, else None"""
+        instr = packet.instr
+        if instr.tuse_rs != Stage.BEGIN:
+            hazard = self._detect_hazard(instr.rs, instr._tuse_rs_delta)
+            if hazard is not None:
+                return hazard
+        if instr.tuse_rt != Stage.BEGIN:
+            return self._detect_hazard(instr.rt, instr._tuse_rt_delta)
+        return None
 
-    def _detect_hazard(self, reg: int, t_use: Stage):
-        if reg == 0: return
+    def _detect_hazard(self, reg: int, t_use_val: int) -> Optional[Tuple[int, str]]:
+        if reg == 0: return None
         
-        for s in [Stage.EX, Stage.MEM, Stage.WB]:
-            prod_packet = self.cpu.shadows[s]
-            if not prod_packet: continue
-            
-            if prod_packet.instr.get_wreg() == reg:
-                t_new = prod_packet.instr.tnew_remaining(s)
-                t_use_val = max(0, t_use.value - Stage.ID.value)
-                
-                if t_use_val < t_new:
-                    raise StallException(f"Hazard on ${reg}: Tuse({t_use_val}) < Tnew({t_new})", reg, s.name)
-                return # Found the latest producer
+        stages = self.cpu._fwd.get(reg)
+        if stages is None: return None
+
+        # every producer is behind ID, only the latest one matters
+        s = stages[0]
+        t_new = self.cpu.shadows[s].instr.tnew - s
+        if t_new < 0: t_new = 0
 
-    def read_reg(self, reg: int, cur_stage: Stage, log: bool = True) -> Word:
+        if t_use_val < t_new: # Tuse < Tnew
+            return reg, STAGE_NAMES[s]
+        return None
+
+    def read_reg(self, reg: int, cur_stage: int) -> int:
         if reg == 0: 
-            return Word(0)
+            return 0
         
-        curpkt = self.cpu.slots[cur_stage]
-        s = PIPELINE[cur_stage]
-        while s is not None and s != Stage.END:
-            prod_packet = self.cpu.shadows[s]
-            if not prod_packet: 
-                s = PIPELINE[s]
-                continue
-            
-            if prod_packet.instr.get_wreg() == reg:
-                t_new = prod_packet.instr.tnew_remaining(s)
-                
-                # Double check stall for safety
-                if cur_stage == Stage.ID:
-                    # Only check stall if the instruction actually reads this register
-                    if reg == curpkt.instr.rs:
-                        t_use = curpkt.instr.tuse_rs
-                    elif reg == curpkt.instr.rt:
-                        t_use = curpkt.instr.tuse_rt
-                    else:
-                        # Instruction doesn't read this register, no stall needed
-                        t_use = Stage.BEGIN
-
-                    if t_use != Stage.BEGIN:
-                        t_use_val = max(0, t_use.value - Stage.ID.value)
-                        if t_use_val < t_new:
-                            raise StallException(f"Hazard on ${reg}: Tuse({t_use_val}) < Tnew({t_new})", reg, s.name)
+        # stalls were already settled by check_stall before any ID hook runs,
+        # so this is only a lookup of the latest producer behind cur_stage
+        shadows = self.cpu.shadows
+        for s in self.cpu._fwd.get(reg, ()):
+            if s <= cur_stage: continue
 
-                if t_new == 0:
-                    # Value must be available if t_new == 0
-                    if reg in prod_packet.alu:
-                        forward_val = prod_packet.alu[reg].new
-                        if log:
-                            self.cpu.log_behavior(ForwardBehavior(
-                                self.cpu.cycle, curpkt.pc, reg, forward_val.value, s.name, cur_stage.name
-                            ))
-                        return forward_val
-                return self.cpu.regs.read(reg)
-            s = PIPELINE[s]
+            prod_packet = shadows[s]
+            # Value must be available once Tnew has run out
+            if prod_packet.instr.tnew <= s and prod_packet.alu_reg == reg:
+                forward_val = prod_packet.alu_new
+                self.cpu.log_behavior(ForwardBehavior(
+                    self.cpu.cycle, self.cpu.slots[cur_stage].pc, reg, forward_val, STAGE_NAMES[s], STAGE_NAMES[cur_stage]
+                ))
+                return forward_val
+            return self.cpu.regs.read(reg)
         return self.cpu.regs.read(reg)
 
-    def read_mem(self, addr: int) -> Word:
+    def read_mem(self, addr: int) -> int:
         return self.cpu.dmem.read(addr)
 
     def write_reg(self, packet, reg: int, val, reason: str):
         if reg == 0: return
-        from .mips.isa import Change
-        val_word = Word(val)
-        packet.alu[reg] = Change(origin=self.read_reg(reg, packet.stage, log=False), new=val_word, reason=reason)
+        packet.alu_reg = reg
+        packet.alu_new = val
+        packet.alu_reason = reason
 
     def write_mem(self, packet, addr: int, val):
-        from .mips.isa import Change
-        val_word = Word(val)
-        packet.mem[addr] = Change(origin=self.read_mem(addr), new=val_word, reason="mem_write")
+        packet.mem_addr = addr
+        packet.mem_val = val